@@ -3,20 +3,31 @@ app.py — Streamlit AI-style CV Builder (full-featured, .docx export)
 
 Dependencies:
   pip install streamlit python-docx pillow
+  pip install pybase64   # optional, faster base64 for photo embedding
 
 Run:
   streamlit run app.py
 """
 
 import streamlit as st
-from io import BytesIO
-from PIL import Image
-from docx import Document
-from docx.shared import Inches
+from io import BytesIO, StringIO
+import glob
+import itertools
+import json
+import os
 import random
-import base64
+import re
+import string
+import tempfile
+import time
+import uuid
 from html import escape
 
+try:
+    import pybase64 as _b64  # SIMD-accelerated, drop-in for the stdlib API
+except ImportError:
+    import base64 as _b64
+
 st.set_page_config(page_title="✨ CV Studio", layout="wide", initial_sidebar_state="expanded")
 
 # --------------------------
@@ -29,6 +40,18 @@ ACTION_VERBS = [
     "Drove", "Facilitated", "Executed", "Mentored", "Launched"
 ]
 METRICS = ["revenue", "efficiency", "customer satisfaction", "cost", "uptime", "retention", "conversion rate"]
+# role keywords: each must start a word in the role title ("sales" -> "Salesperson"), so
+# mid-word hits no longer count ("pm" in "Equipment", but also "sales" in "Presales")
+_SALES_RE = re.compile(r"\b(?:sales|account|business)")
+_ENGINEERING_RE = re.compile(r"\b(?:engineer|developer|dev|software)")
+_PRODUCT_RE = re.compile(r"\b(?:product|pm)")
+
+
+@st.cache_resource(show_spinner=False)
+def _verb_cycle():
+    """Shuffle ACTION_VERBS once per process; smart_expand pulls the next verb instead of drawing one each time."""
+    # cached because Streamlit re-executes this script on every rerun
+    return itertools.cycle(random.sample(ACTION_VERBS, len(ACTION_VERBS)))
 
 
 def smart_expand(description: str, role: str = "", company: str = "", n: int = 3):
@@ -40,55 +63,412 @@ def smart_expand(description: str, role: str = "", company: str = "", n: int = 3
         return []
 
     desc = " ".join(description.strip().split())
-    bullets = []
+    verbs = _verb_cycle()
 
     # metric-based bullet
     metric = random.choice(METRICS)
     value = random.choice([8, 10, 12, 15, 20, 25, 30])
-    b1 = f"{random.choice(ACTION_VERBS)} {desc} at {company}." if company else f"{random.choice(ACTION_VERBS)} {desc}."
-    b2 = f"{random.choice(ACTION_VERBS)} {desc}, achieving ~{value}% improvement in {metric}."
-    b3 = f"{random.choice(ACTION_VERBS)} {desc} by focusing on stakeholder needs and measurable KPIs."
+    b1 = f"{next(verbs)} {desc} at {company}." if company else f"{next(verbs)} {desc}."
+    b2 = f"{next(verbs)} {desc}, achieving ~{value}% improvement in {metric}."
+    b3 = f"{next(verbs)} {desc} by focusing on stakeholder needs and measurable KPIs."
 
     candidates = [b2, b1, b3]
     # add role-specific flavor
     role_l = (role or "").lower()
-    if any(x in role_l for x in ["sales", "account", "business"]):
+    if _SALES_RE.search(role_l):
         candidates.append("Built strong client relationships and expanded accounts through consultative selling.")
-    if any(x in role_l for x in ["engineer", "developer", "dev", "software"]):
+    if _ENGINEERING_RE.search(role_l):
         candidates.append("Improved system reliability and deployment velocity through automation and testing.")
-    if any(x in role_l for x in ["product", "pm", "product manager"]):
+    if _PRODUCT_RE.search(role_l):
         candidates.append("Prioritised features and worked cross-functionally to launch product improvements.")
     random.shuffle(candidates)
 
-    for c in candidates:
-        if len(bullets) >= n:
-            break
-        # ensure snappy phrasing
-        s = c.strip()
-        if not s.endswith("."):
-            s += "."
-        bullets.append(s)
-    # fallback duplication avoided
-    if len(bullets) < n:
-        while len(bullets) < n:
-            bullets.append(f"{random.choice(ACTION_VERBS)} {desc}.")
-    return bullets[:n]
-
-
-def pil_to_datauri(uploaded_file):
-    """Convert an uploaded file (UploadedFile) to a data URI for embedding in HTML."""
+    # ensure snappy phrasing
+    bullets = [c.strip() if c.strip().endswith(".") else c.strip() + "." for c in candidates[:n]]
+    # top up with plain "<verb> <desc>." lines if there aren't enough candidates
+    bullets += [f"{next(verbs)} {desc}." for _ in range(n - len(bullets))]
+    return bullets
+
+
+PREVIEW_PHOTO_SIZE = (128, 128)
+STORED_PHOTO_SIZE = (512, 512)
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+# photo files untouched for longer than this are treated as left over from ended sessions
+PHOTO_FILE_TTL = 60 * 60
+_TEMP_PHOTO_PREFIX = "cvstudio_photo_"
+
+
+def save_photo_thumbnail(uploaded_file, size=STORED_PHOTO_SIZE):
+    """
+    Downscale an uploaded photo and write it to a temp JPEG on disk.
+    Returns the file path, so session state never pins the raw upload bytes.
+    """
     if not uploaded_file:
         return None
+    from PIL import Image  # imported lazily: only needed when a photo is uploaded
+
+    try:
+        uploaded_file.seek(0)
+        img = Image.open(uploaded_file)
+        if img.mode not in ("RGB", "L", "CMYK") or "transparency" in img.info:
+            # palette/bilevel images only resize with nearest-neighbour, and resizing with alpha
+            # premultiplies transparent pixels to black — flatten these at full size first
+            img = img.convert("RGB")
+        # thumbnail() before any convert() lets JPEG uploads decode straight at reduced scale
+        img.thumbnail(size, Image.LANCZOS)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        with tempfile.NamedTemporaryFile(prefix=_TEMP_PHOTO_PREFIX, suffix=".jpg", delete=False) as tf:
+            img.save(tf, "JPEG", quality=85)
+        return tf.name
+    except Exception:
+        return None
+
+
+def save_static_preview(path, size=PREVIEW_PHOTO_SIZE):
+    """
+    Write a preview-size copy of the stored photo into ./static and return its file path.
+    Streamlit serves it at app/static/<name> when server.enableStaticServing is on, so the
+    preview can reference it by URL instead of embedding base64 in the iframe.
+    """
+    if not path:
+        return None
+    from PIL import Image
+
     try:
-        img = Image.open(uploaded_file).convert("RGB")
+        img = Image.open(path)
+        img.thumbnail(size, Image.LANCZOS)
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        # unguessable name: files under static/ are readable by anyone who has the URL
+        out = os.path.join(STATIC_DIR, f"_preview_{uuid.uuid4().hex}.jpg")
+        img.save(out, "JPEG", quality=82, optimize=True)
+        return out
+    except Exception:
+        return None
+
+
+def clear_photo():
+    """Delete the stored photo files (if any) and reset the photo session keys."""
+    for key in ("photo_path", "photo_static_path"):
+        path = st.session_state.get(key)
+        if path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        st.session_state[key] = None
+    st.session_state.photo_id = None
+
+
+def sweep_stale_photos(max_age=PHOTO_FILE_TTL):
+    """
+    Delete temp thumbnails and static previews older than max_age seconds.
+    Sessions that end never call clear_photo(), so this bounds what piles up on disk.
+    """
+    cutoff = time.time() - max_age
+    paths = glob.glob(os.path.join(tempfile.gettempdir(), f"{_TEMP_PHOTO_PREFIX}*.jpg"))
+    paths += glob.glob(os.path.join(STATIC_DIR, "_preview_*.jpg"))
+    for path in paths:
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def pil_to_datauri(path, size=PREVIEW_PHOTO_SIZE):
+    """Read the stored photo from disk and return a small JPEG data URI for the preview."""
+    if not path:
+        return None
+    from PIL import Image
+
+    try:
+        img = Image.open(path)
+        img.thumbnail(size, Image.LANCZOS)
         buf = BytesIO()
-        img.save(buf, format="PNG")
-        b64 = base64.b64encode(buf.getvalue()).decode()
-        return f"data:image/png;base64,{b64}"
+        img.save(buf, "JPEG", quality=82, optimize=True)
+        return f"data:image/jpeg;base64,{_b64.b64encode(buf.getvalue()).decode('ascii')}"
     except Exception:
         return None
 
 
+@st.cache_resource(show_spinner=False)
+def _blank_docx_template_bytes() -> bytes:
+    """Serialise python-docx's default template once; exports start from a copy of these bytes."""
+    from docx import Document
+
+    buf = BytesIO()
+    Document().save(buf)
+    return buf.getvalue()
+
+
+CONTACT_FIELDS = ("email", "phone", "location", "linkedin", "portfolio")
+CV_SECTION_ORDER = ("header", "contact", "summary", "photo", "experience", "education", "skills")
+# the .docx export has always listed education before experience
+DOCX_SECTION_ORDER = ("header", "contact", "summary", "photo", "education", "experience", "skills")
+
+
+def _iter_cv_sections(p, exps, edus, skills, photo_path=None, order=CV_SECTION_ORDER):
+    """
+    Yield (section, payload) records for an export in the given order, skipping empty sections.
+    Both export writers consume this, so the skip rules live in one place.
+    """
+    payloads = {
+        "header": (p.get("name", ""), p.get("title", "")),
+        "contact": [p[k] for k in CONTACT_FIELDS if p.get(k)],
+        "summary": p.get("summary"),
+        "photo": photo_path,
+        "experience": exps,
+        "education": edus,
+        "skills": skills,
+    }
+    for section in order:
+        payload = payloads[section]
+        # the header is always written, even for an unnamed CV
+        if payload or section == "header":
+            yield section, payload
+
+
+# ---- DOCX writers: one per section type ----
+def _docx_header(doc, payload):
+    name, title = payload
+    doc.add_heading(name or "Unnamed", level=0)
+    if title:
+        doc.add_paragraph(title)
+
+
+def _docx_photo(doc, path):
+    from docx.shared import Inches
+
+    try:
+        # pass the path so python-docx reads the stored thumbnail itself — no BytesIO copies
+        doc.add_picture(path, width=Inches(1.2))
+    except Exception:
+        # silently ignore photo errors
+        pass
+
+
+def _docx_experience(doc, exps):
+    doc.add_heading("Experience", level=1)
+    # resolve the bullet style once rather than by name for every paragraph
+    try:
+        bullet_style = doc.styles["List Bullet"]
+    except KeyError:
+        bullet_style = None
+    for ex in exps:
+        para = doc.add_paragraph()
+        para.add_run(f"{ex.get('role','')} — {ex.get('company','')}").bold = True
+        if ex.get("period"):
+            para.add_run(f"  ({ex.get('period')})")
+        for b in ex.get("bullets", []):
+            if bullet_style is not None:
+                doc.add_paragraph(b, style=bullet_style)
+            else:
+                # fallback if style name not present
+                doc.add_paragraph(f"• {b}")
+
+
+def _docx_education(doc, edus):
+    doc.add_heading("Education", level=1)
+    for ed in edus:
+        para = doc.add_paragraph()
+        para.add_run(ed.get("degree", "") + " — ").bold = True
+        para.add_run(ed.get("school", ""))
+        if ed.get("year"):
+            para.add_run(f" ({ed['year']})")
+
+
+def _docx_skills(doc, skills):
+    doc.add_heading("Skills", level=1)
+    doc.add_paragraph(", ".join(skills))
+
+
+_DOCX_WRITERS = {
+    "header": _docx_header,
+    "contact": lambda doc, contact: doc.add_paragraph(" | ".join(contact)),
+    "summary": lambda doc, summary: doc.add_paragraph(summary),
+    "photo": _docx_photo,
+    "experience": _docx_experience,
+    "education": _docx_education,
+    "skills": _docx_skills,
+}
+
+
+def build_docx(sections):
+    """Write CV sections into a new .docx and return it as a BytesIO."""
+    # python-docx is imported here so text-only reruns never pay for it
+    from docx import Document
+
+    doc = Document(BytesIO(_blank_docx_template_bytes()))
+    for section, payload in sections:
+        _DOCX_WRITERS[section](doc, payload)
+    buf = BytesIO()
+    doc.save(buf)
+    return buf
+
+
+# ---- HTML writers: sections without an entry (contact, photo) are left out of the HTML export ----
+def _html_header(payload):
+    name, title = (escape(v) for v in payload)
+    return f"""<!doctype html><html><head><meta charset="utf-8"><title>{name} — CV</title></head><body>
+            <h1>{name}</h1><h3>{title}</h3>"""
+
+
+def _html_experience(exps):
+    out = ["<h2>Experience</h2>"]
+    for ex in exps:
+        out.append(f"<h3>{escape(ex.get('role',''))} — {escape(ex.get('company',''))}</h3>")
+        out.append("<ul>" + "".join(f"<li>{escape(b)}</li>" for b in ex.get("bullets", [])) + "</ul>")
+    return "".join(out)
+
+
+def _html_education(edus):
+    return "<h2>Education</h2>" + "".join(
+        f"<div><b>{escape(ed.get('degree',''))}</b> — {escape(ed.get('school',''))} ({escape(ed.get('year',''))})</div>"
+        for ed in edus
+    )
+
+
+_HTML_WRITERS = {
+    "header": _html_header,
+    "summary": lambda summary: "<p>" + escape(summary).replace("\n", "<br>") + "</p>",
+    "experience": _html_experience,
+    "education": _html_education,
+    "skills": lambda skills: "<h2>Skills</h2><div>" + escape(", ".join(skills)) + "</div>",
+}
+
+
+def build_html(sections):
+    """Render CV sections as a standalone HTML document."""
+    buf = StringIO()
+    for section, payload in sections:
+        writer = _HTML_WRITERS.get(section)
+        if writer:
+            buf.write(writer(payload))
+    buf.write("</body></html>")
+    return buf.getvalue()
+
+
+_ESCAPE_SEP = "\x01"
+
+
+def _escape_many(texts):
+    """HTML-escape a batch of strings with a single escape() pass over one joined buffer."""
+    if not texts:
+        return []
+    joined = _ESCAPE_SEP.join(texts)
+    if joined.count(_ESCAPE_SEP) != len(texts) - 1:
+        # the separator occurs in user text — fall back to escaping one by one
+        return [escape(t) for t in texts]
+    return escape(joined).split(_ESCAPE_SEP)
+
+
+# Constant parts of the preview templates, parsed once; only the $fields change per render.
+_MODERN_TMPL = string.Template("""
+<html><head><meta charset='utf-8'>
+<style>
+body{font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial; color:#1b2b3a; background:transparent;}
+.card{background:white;padding:18px;border-radius:10px;box-shadow:0 8px 24px rgba(12,30,60,0.08);width: 380px;}
+.header{display:flex;gap:12px;align-items:center;border-bottom:3px solid #f3f6fb;padding-bottom:10px;margin-bottom:10px}
+.name{font-weight:700;font-size:20px;color:$accent}
+.title{font-size:13px;color:#334155;margin-top:3px}
+.meta{font-size:12px;color:#64748b;margin-top:8px}
+.section-title{font-weight:700;margin-top:12px;color:#0f172a;font-size:12px;border-bottom:1px solid #eef2ff;padding-bottom:4px}
+.skill{display:inline-block;padding:6px 8px;border-radius:10px;background:#f0faff;margin:4px 4px 0 0;font-size:12px;color:$accent}
+ul{margin:6px 0 0 18px;padding:0}
+li{margin-bottom:6px;font-size:13px;}
+.photo{width:64px;height:64px;border-radius:8px;object-fit:cover}
+</style></head><body>
+<div class='card'>
+  <div class='header'>
+    $photo
+    <div>
+      <div class='name'>$name</div>
+      <div class='title'>$title</div>
+      <div class='meta'>$email · $phone</div>
+    </div>
+  </div>
+  <div class='summary'>$summary</div>
+  <div class='section-title'>Experience</div>
+""")
+_CLASSIC_TMPL = string.Template("""
+<html><head><meta charset='utf-8'>
+<style>
+body{font-family: 'Times New Roman', Times, serif; color:#000;}
+.paper{width:380px;padding:16px;background:white;border:1px solid #eee}
+h1{margin:0;font-size:20px}
+h2{margin:4px 0 8px 0;font-size:13px;color:#333}
+.muted{color:#555;font-size:12px}
+ul{margin:6px 0 0 18px;padding:0}
+li{margin-bottom:6px;font-size:13px}
+</style></head><body><div class='paper'>
+<h1>$name</h1><div class='muted'>$title</div>
+<div style='margin-top:8px'>$summary</div>
+<h2>Experience</h2>
+""")
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def _render_preview_html(ctx_json: str, style: str, accent: str):
+    """Render the live-preview HTML. Cached on the JSON-serialised context so unchanged CVs skip rebuilding."""
+    ctx = json.loads(ctx_json)
+    photo = ctx.get("photo")
+    experience = ctx.get("experience", [])
+    education = ctx.get("education", [])
+    skills = ctx.get("skills", [])
+
+    # collect every user-supplied fragment in emit order, escape them in one go,
+    # then consume them in the same order below
+    texts = [ctx.get(k, "") for k in ("name", "title", "email", "phone", "summary")]
+    for ex in experience:
+        texts += [ex.get("role", ""), ex.get("company", ""), ex.get("period", "")]
+        texts += ex.get("bullets", [])
+    for ed in education:
+        texts += [ed.get("degree", ""), ed.get("school", ""), ed.get("year", "")]
+    texts += skills
+    esc = iter(_escape_many(texts))
+    name, title, email, phone, summary = (next(esc) for _ in range(5))
+
+    # Modern template
+    if style == "Modern Color":
+        buf = StringIO()
+        buf.write(_MODERN_TMPL.substitute(
+            accent=accent, photo=f"<img src='{photo}' class='photo'/>" if photo else "",
+            name=name, title=title, email=email, phone=phone, summary=summary,
+        ))
+        for ex in experience:
+            buf.write(f"<div style='margin-top:8px'><strong>{next(esc)}</strong> — {next(esc)} <div style='color:#64748b;font-size:12px'>{next(esc)}</div>")
+            buf.write("<ul>")
+            for _ in ex.get("bullets", []):
+                buf.write(f"<li>{next(esc)}</li>")
+            buf.write("</ul></div>")
+        buf.write("<div class='section-title'>Education</div>")
+        for _ in education:
+            buf.write(f"<div style='margin-top:8px'><strong>{next(esc)}</strong> — {next(esc)} <div style='font-size:12px;color:#64748b'>{next(esc)}</div></div>")
+        buf.write("<div class='section-title'>Skills</div><div>")
+        for _ in skills:
+            buf.write(f"<span class='skill'>{next(esc)}</span>")
+        buf.write("</div></div></body></html>")
+        return buf.getvalue()
+    else:
+        # Classic / Minimal templates
+        buf = StringIO()
+        buf.write(_CLASSIC_TMPL.substitute(name=name, title=title, summary=summary))
+        for ex in experience:
+            buf.write(f"<div><strong>{next(esc)}</strong> — {next(esc)} <div class='muted'>{next(esc)}</div>")
+            buf.write("<ul>")
+            for _ in ex.get("bullets", []):
+                buf.write(f"<li>{next(esc)}</li>")
+            buf.write("</ul></div>")
+        buf.write("<h2>Education</h2>")
+        for _ in education:
+            buf.write(f"<div><strong>{next(esc)}</strong> — {next(esc)} ({next(esc)})</div>")
+        buf.write("<h2>Skills</h2><div>" + ", ".join(next(esc) for _ in skills) + "</div>")
+        buf.write("</div></body></html>")
+        return buf.getvalue()
+
+
 # --------------------------
 # Session state defaults
 # --------------------------
@@ -120,25 +500,27 @@ if "education_list" not in st.session_state:
     ]
 if "skills" not in st.session_state:
     st.session_state.skills = ["Client Relationships", "Inspection", "Asset Integrity"]
-if "photo_file" not in st.session_state:
-    st.session_state.photo_file = None
+if "photo_path" not in st.session_state:
+    st.session_state.photo_path = None
+    st.session_state.photo_static_path = None
+    st.session_state.photo_id = None
 if "design" not in st.session_state:
     st.session_state.design = {"style": "Modern Color", "accent": "#0b6efd", "include_photo": True}
 
 # --------------------------
 # Page layout (header)
 # --------------------------
-st.markdown(
-    """
+# Emitted on every run on purpose: Streamlit drops any element a rerun doesn't re-emit,
+# so guarding this behind session state would strip the styles after the first interaction.
+_CSS = """
     <style>
       .big-title { font-size:32px; font-weight:700; color:#102A43; }
       .muted { color:#516B7A; }
       .app-header { display:flex; align-items:center; gap:18px; }
       .spark { font-size:28px; }
     </style>
-    """,
-    unsafe_allow_html=True,
-)
+    """
+st.markdown(_CSS, unsafe_allow_html=True)
 header_col1, header_col2 = st.columns([4, 1])
 with header_col1:
     st.markdown("<div class='app-header'><div class='spark'>✨</div><div><div class='big-title'>CV Studio</div><div class='muted'>AI-style bullets — DOCX export — Beautiful templates</div></div></div>", unsafe_allow_html=True)
@@ -166,7 +548,7 @@ with header_col2:
         ]
         st.session_state.education_list = [{"degree": "HND Mechanical Engineering", "school": "Accra Technical University", "year": "2016"}]
         st.session_state.skills = ["Sales", "Client Management", "NDT", "Asset Integrity"]
-        st.session_state.photo_file = None
+        clear_photo()
         st.success("Sample data loaded — explore tabs to edit!")
 
 # --------------------------
@@ -185,8 +567,20 @@ with left:
         # Photo uploader
         with col1:
             profile_photo = st.file_uploader("Upload Profile Photo", type=["png", "jpg", "jpeg"])
+            if any(path and not os.path.exists(path)
+                   for path in (st.session_state.photo_path, st.session_state.photo_static_path)):
+                # swept as stale by another session; rebuilt below if the uploader still holds the file
+                clear_photo()
             if profile_photo:
-                st.session_state.photo_file = profile_photo
+                # downscale to disk once per upload; reruns reuse the stored thumbnail
+                photo_id = getattr(profile_photo, "file_id", None) or profile_photo.name
+                if st.session_state.photo_id != photo_id:
+                    clear_photo()
+                    sweep_stale_photos()
+                    st.session_state.photo_path = save_photo_thumbnail(profile_photo)
+                    st.session_state.photo_id = photo_id
+                    if st.get_option("server.enableStaticServing"):
+                        st.session_state.photo_static_path = save_static_preview(st.session_state.photo_path)
 
         # Profile details
         with col2:
@@ -257,7 +651,7 @@ with left:
 
         st.markdown("**Existing experience (top = newest). Click edit to change bullets or remove.**")
         # list entries with edit/remove
-        for i, ex in enumerate(list(st.session_state.experience_list)):
+        for i, ex in enumerate(st.session_state.experience_list):
             with st.expander(f"{ex.get('role','Role')} — {ex.get('company','')}", expanded=False):
                 r = st.text_input("Role", value=ex.get("role", ""), key=f"role_{i}")
                 c = st.text_input("Company", value=ex.get("company", ""), key=f"company_{i}")
@@ -302,7 +696,7 @@ with left:
                 st.success("Education added")
         if st.session_state.education_list:
             st.markdown("**Existing education**")
-            for i, ed in enumerate(list(st.session_state.education_list)):
+            for i, ed in enumerate(st.session_state.education_list):
                 cols = st.columns([4, 1])
                 with cols[0]:
                     st.write(f"**{ed.get('degree','')}** — {ed.get('school','')} ({ed.get('year','')})")
@@ -323,7 +717,7 @@ with left:
                 st.success("Skill added")
         if st.session_state.skills:
             st.markdown("**Current skills**")
-            for i, s in enumerate(list(st.session_state.skills)):
+            for i, s in enumerate(st.session_state.skills):
                 cols = st.columns([4, 1])
                 with cols[0]:
                     st.write(s)
@@ -348,81 +742,16 @@ with left:
         download_col1, download_col2 = st.columns([1, 1])
         if download_col1.button("📥 Build & Show DOCX (prepare for download)"):
             # Build .docx from current session state and present download button
-            doc_bytes = BytesIO()
-            doc = Document()
-
-            # Header (name + title)
-            name = st.session_state.profile.get("name", "")
-            title = st.session_state.profile.get("title", "")
-            doc.add_heading(name or "Unnamed", level=0)
-            if title:
-                doc.add_paragraph(title)
-
-            # Contact meta (single line)
-            contact_parts = []
-            if st.session_state.profile.get("email"):
-                contact_parts.append(st.session_state.profile["email"])
-            if st.session_state.profile.get("phone"):
-                contact_parts.append(st.session_state.profile["phone"])
-            if st.session_state.profile.get("location"):
-                contact_parts.append(st.session_state.profile["location"])
-            if st.session_state.profile.get("linkedin"):
-                contact_parts.append(st.session_state.profile["linkedin"])
-            if st.session_state.profile.get("portfolio"):
-                contact_parts.append(st.session_state.profile["portfolio"])
-            if contact_parts:
-                doc.add_paragraph(" | ".join(contact_parts))
-
-            # Summary
-            if st.session_state.profile.get("summary"):
-                doc.add_paragraph(st.session_state.profile.get("summary"))
-
-            # Add photo if included
-            if st.session_state.design.get("include_photo", True) and st.session_state.photo_file:
-                try:
-                    # doc.add_picture expects a file-like object positioned at 0
-                    img_bytes = BytesIO(st.session_state.photo_file.getvalue())
-                    img_bytes.seek(0)
-                    doc.add_picture(img_bytes, width=Inches(1.2))
-                except Exception:
-                    # silently ignore photo errors
-                    pass
-
-            # Education
-            if st.session_state.education_list:
-                doc.add_heading("Education", level=1)
-                for ed in st.session_state.education_list:
-                    p = doc.add_paragraph()
-                    p.add_run(ed.get("degree", "") + " — ").bold = True
-                    p.add_run(ed.get("school", ""))
-                    if ed.get("year"):
-                        p.add_run(f" ({ed['year']})")
-
-            # Experience
-            if st.session_state.experience_list:
-                doc.add_heading("Experience", level=1)
-                for ex in st.session_state.experience_list:
-                    p = doc.add_paragraph()
-                    p.add_run(f"{ex.get('role','')} — {ex.get('company','')}").bold = True
-                    if ex.get("period"):
-                        p.add_run(f"  ({ex.get('period')})")
-                    # bullets
-                    for b in ex.get("bullets", []):
-                        try:
-                            doc.add_paragraph(b, style="List Bullet")
-                        except Exception:
-                            # fallback if style name not present
-                            doc.add_paragraph(f"• {b}")
-
-            # Skills
-            if st.session_state.skills:
-                doc.add_heading("Skills", level=1)
-                doc.add_paragraph(", ".join(st.session_state.skills))
-
-            # Save
-            doc.save(doc_bytes)
-            doc_bytes.seek(0)
-            st.session_state._last_docx = doc_bytes.getvalue()
+            photo_path = st.session_state.photo_path if st.session_state.design.get("include_photo", True) else None
+            sections = _iter_cv_sections(
+                dict(st.session_state.profile),
+                list(st.session_state.experience_list),
+                list(st.session_state.education_list),
+                list(st.session_state.skills),
+                photo_path,
+                order=DOCX_SECTION_ORDER,
+            )
+            st.session_state._last_docx = build_docx(sections).getvalue()
             st.success("DOCX built — use the download button below to save it locally.")
 
         # provide download button if doc ready
@@ -436,29 +765,16 @@ with left:
 
         # HTML preview download
         if download_col2.button("📄 Build & Download HTML preview"):
-            name = escape(st.session_state.profile.get("name", ""))
-            title = escape(st.session_state.profile.get("title", ""))
-            summary = escape(st.session_state.profile.get("summary", "")).replace("\n", "<br>")
-            html = f"""<!doctype html><html><head><meta charset="utf-8"><title>{name} — CV</title></head><body>
-            <h1>{name}</h1><h3>{title}</h3><p>{summary}</p>"""
-            # experience
-            if st.session_state.experience_list:
-                html += "<h2>Experience</h2>"
-                for ex in st.session_state.experience_list:
-                    html += f"<h3>{escape(ex.get('role',''))} — {escape(ex.get('company',''))}</h3>"
-                    html += "<ul>"
-                    for b in ex.get("bullets", []):
-                        html += f"<li>{escape(b)}</li>"
-                    html += "</ul>"
-            if st.session_state.education_list:
-                html += "<h2>Education</h2>"
-                for ed in st.session_state.education_list:
-                    html += f"<div><b>{escape(ed.get('degree',''))}</b> — {escape(ed.get('school',''))} ({escape(ed.get('year',''))})</div>"
-            if st.session_state.skills:
-                html += "<h2>Skills</h2><div>" + escape(", ".join(st.session_state.skills)) + "</div>"
-            html += "</body></html>"
+            p = dict(st.session_state.profile)
+            sections = _iter_cv_sections(
+                p,
+                list(st.session_state.experience_list),
+                list(st.session_state.education_list),
+                list(st.session_state.skills),
+            )
+            html = build_html(sections)
             b = html.encode("utf-8")
-            st.download_button("⬇️ Download HTML", data=b, file_name=f"{(st.session_state.profile.get('name') or 'candidate').replace(' ','_')}_CV.html", mime="text/html")
+            st.download_button("⬇️ Download HTML", data=b, file_name=f"{(p.get('name') or 'candidate').replace(' ','_')}_CV.html", mime="text/html")
 
 # --------------------------
 # Right column: Live preview (HTML styled)
@@ -466,82 +782,13 @@ with left:
 with right:
     st.subheader("Live preview")
 
-    def render_preview_html(ctx):
-        style = st.session_state.design.get("style", "Modern Color")
-        accent = st.session_state.design.get("accent", "#0b6efd")
-        photo = ctx.get("photo")
-        # Modern template
-        if style == "Modern Color":
-            html = f"""
-            <html><head><meta charset='utf-8'>
-            <style>
-            body{{font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial; color:#1b2b3a; background:transparent;}}
-            .card{{background:white;padding:18px;border-radius:10px;box-shadow:0 8px 24px rgba(12,30,60,0.08);width: 380px;}}
-            .header{{display:flex;gap:12px;align-items:center;border-bottom:3px solid #f3f6fb;padding-bottom:10px;margin-bottom:10px}}
-            .name{{font-weight:700;font-size:20px;color:{accent}}}
-            .title{{font-size:13px;color:#334155;margin-top:3px}}
-            .meta{{font-size:12px;color:#64748b;margin-top:8px}}
-            .section-title{{font-weight:700;margin-top:12px;color:#0f172a;font-size:12px;border-bottom:1px solid #eef2ff;padding-bottom:4px}}
-            .skill{{display:inline-block;padding:6px 8px;border-radius:10px;background:#f0faff;margin:4px 4px 0 0;font-size:12px;color:{accent}}}
-            ul{{margin:6px 0 0 18px;padding:0}}
-            li{{margin-bottom:6px;font-size:13px;}}
-            .photo{{width:64px;height:64px;border-radius:8px;object-fit:cover}}
-            </style></head><body>
-            <div class='card'>
-              <div class='header'>
-                {f"<img src='{photo}' class='photo'/>" if photo else ""}
-                <div>
-                  <div class='name'>{ctx.get('name','')}</div>
-                  <div class='title'>{ctx.get('title','')}</div>
-                  <div class='meta'>{ctx.get('email','')} · {ctx.get('phone','')}</div>
-                </div>
-              </div>
-              <div class='summary'>{ctx.get('summary','')}</div>
-              <div class='section-title'>Experience</div>
-            """
-            for ex in ctx.get("experience", []):
-                html += f"<div style='margin-top:8px'><strong>{escape(ex.get('role',''))}</strong> — {escape(ex.get('company',''))} <div style='color:#64748b;font-size:12px'>{escape(ex.get('period',''))}</div>"
-                html += "<ul>"
-                for b in ex.get("bullets", []):
-                    html += f"<li>{escape(b)}</li>"
-                html += "</ul></div>"
-            html += "<div class='section-title'>Education</div>"
-            for ed in ctx.get("education", []):
-                html += f"<div style='margin-top:8px'><strong>{escape(ed.get('degree',''))}</strong> — {escape(ed.get('school',''))} <div style='font-size:12px;color:#64748b'>{escape(ed.get('year',''))}</div></div>"
-            html += "<div class='section-title'>Skills</div><div>"
-            for s in ctx.get("skills", []):
-                html += f"<span class='skill'>{escape(s)}</span>"
-            html += "</div></div></body></html>"
-            return html
+    # photo: prefer a static-file URL (keeps the iframe srcdoc small); fall back to an inline data URI
+    photo_src = None
+    if st.session_state.photo_path and st.session_state.design.get("include_photo", True):
+        if st.session_state.photo_static_path:
+            photo_src = f"app/static/{os.path.basename(st.session_state.photo_static_path)}"
         else:
-            # Classic / Minimal templates
-            html = f"""
-            <html><head><meta charset='utf-8'>
-            <style>
-            body{{font-family: 'Times New Roman', Times, serif; color:#000;}}
-            .paper{{width:380px;padding:16px;background:white;border:1px solid #eee}}
-            h1{{margin:0;font-size:20px}}
-            h2{{margin:4px 0 8px 0;font-size:13px;color:#333}}
-            .muted{{color:#555;font-size:12px}}
-            ul{{margin:6px 0 0 18px;padding:0}}
-            li{{margin-bottom:6px;font-size:13px}}
-            </style></head><body><div class='paper'>
-            <h1>{escape(ctx.get('name',''))}</h1><div class='muted'>{escape(ctx.get('title',''))}</div>
-            <div style='margin-top:8px'>{escape(ctx.get('summary',''))}</div>
-            <h2>Experience</h2>
-            """
-            for ex in ctx.get("experience", []):
-                html += f"<div><strong>{escape(ex.get('role',''))}</strong> — {escape(ex.get('company',''))} <div class='muted'>{escape(ex.get('period',''))}</div>"
-                html += "<ul>"
-                for b in ex.get("bullets", []):
-                    html += f"<li>{escape(b)}</li>"
-                html += "</ul></div>"
-            html += "<h2>Education</h2>"
-            for ed in ctx.get("education", []):
-                html += f"<div><strong>{escape(ed.get('degree',''))}</strong> — {escape(ed.get('school',''))} ({escape(ed.get('year',''))})</div>"
-            html += "<h2>Skills</h2><div>" + escape(", ".join(ctx.get("skills", []))) + "</div>"
-            html += "</div></body></html>"
-            return html
+            photo_src = pil_to_datauri(st.session_state.photo_path)
 
     # build context from session state
     preview_ctx = {
@@ -553,10 +800,14 @@ with right:
         "experience": st.session_state.experience_list,
         "education": st.session_state.education_list,
         "skills": st.session_state.skills,
-        "photo": pil_to_datauri(st.session_state.photo_file) if (st.session_state.photo_file and st.session_state.design.get("include_photo", True)) else None
+        "photo": photo_src
     }
 
-    preview_html = render_preview_html(preview_ctx)
+    preview_html = _render_preview_html(
+        json.dumps(preview_ctx, sort_keys=True, default=str),
+        st.session_state.design.get("style", "Modern Color"),
+        st.session_state.design.get("accent", "#0b6efd"),
+    )
     st.components.v1.html(preview_html, height=720, scrolling=True)
 
 # --------------------------